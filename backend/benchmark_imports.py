@@ -0,0 +1,75 @@
+"""
+Import-time profile of the API and its converter dependencies
+Each module is imported in a fresh interpreter with `python -X importtime`
+Run from the backend folder: python benchmark_imports.py
+"""
+import subprocess
+import sys
+
+MODULES = [
+    "main",
+    "converters.pdf_to_word",
+    "converters.word_to_pdf",
+    "converters.split_pdf",
+    "converters.merge_pdf",
+    "PyPDF2",
+    "docx",
+    "docx2pdf",
+    "pdf2docx",
+    "fitz",
+    "cv2",
+    "numpy",
+]
+
+# Must not be imported when the API process starts
+HEAVY_MODULES = ["pdf2docx", "fitz", "cv2", "numpy", "docx", "docx2pdf"]
+
+
+def profile_import(module: str):
+    """Cumulative import time of module in milliseconds, or None if it fails to import"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        return None
+
+    # Lines look like: "import time:  self [us] |  cumulative | imported package"
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1000
+    return None
+
+
+def heavy_modules_loaded_by_main():
+    code = (
+        "import sys, main; "
+        f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return [name for name in result.stdout.strip().split(",") if name]
+
+
+if __name__ == "__main__":
+    print(f"\n{'='*50}")
+    print("IMPORT TIME PROFILE")
+    print(f"{'='*50}")
+
+    for module in MODULES:
+        elapsed = profile_import(module)
+        if elapsed is None:
+            print(f"{module:<28} not importable")
+        else:
+            print(f"{module:<28} {elapsed:>10.1f} ms")
+
+    loaded = heavy_modules_loaded_by_main()
+    print(f"{'-'*50}")
+    if loaded is None:
+        print("Heavy modules loaded by main: unknown (main failed to import)")
+    else:
+        print(f"Heavy modules loaded by main: {', '.join(loaded) or 'none'}")
+    print(f"{'='*50}\n")
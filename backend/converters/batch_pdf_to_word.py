@@ -0,0 +1,172 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import zipfile
+import zlib
+import os
+
+from converters.pdf_to_word import convert_pdf_to_word
+from converters.sandbox import run_sandboxed, WORKER_COUNT
+from converters.ocr_pdf import OCR_JOB_TIMEOUT
+
+# Batch limits, for the whole request (all uploaded PDFs and ZIP contents)
+MAX_BATCH_FILES = 500
+MAX_BATCH_BYTES = 2 * 1024 * 1024 * 1024
+
+# Shared by all batch requests, so together they leave half of the converter
+# workers free for single-file requests
+BATCH_CONCURRENCY = max(1, WORKER_COUNT // 2)
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="batch")
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _ZipStream:
+    """Write-only file object that hands out whatever ZipFile wrote since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Pending bytes as a list of at most one chunk, so nothing empty gets sent"""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return [data] if data else []
+
+
+def _remove_files(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def extract_pdfs_from_zip(zip_path: str, output_dir: str, prefix: str,
+                          max_files: int = MAX_BATCH_FILES, max_bytes: int = MAX_BATCH_BYTES):
+    """
+    Extract the PDF files from an uploaded ZIP
+    max_files / max_bytes: what is left of the request's batch limits
+    Returns (pdf_files, errors, bytes_written), pdf_files being a list of
+    (original_name, extracted_path). Entries that cannot be extracted
+    (encrypted, unsupported compression, corrupt) are listed in errors.
+    Extracted files get generated names, entry paths are never used on disk
+    """
+    pdf_files = []
+    errors = []
+    total_bytes = 0
+
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(".pdf"):
+                    continue
+
+                if len(pdf_files) >= max_files:
+                    raise ValueError(f"Maximum {MAX_BATCH_FILES} PDF files allowed per batch")
+
+                output_path = os.path.join(output_dir, f"{prefix}_{len(pdf_files)}.pdf")
+                entry_bytes = 0
+                try:
+                    with archive.open(info) as source, open(output_path, 'wb') as target:
+                        # Count real bytes, the sizes in the ZIP header can lie
+                        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                            entry_bytes += len(chunk)
+                            if total_bytes + entry_bytes > max_bytes:
+                                raise ValueError("Uploaded PDFs are too large in total")
+                            target.write(chunk)
+                except (RuntimeError, NotImplementedError, zipfile.BadZipFile, zlib.error, EOFError) as e:
+                    _remove_files([output_path])
+                    reason = "entry is password protected" if info.flag_bits & 0x1 else str(e)
+                    errors.append(f"{os.path.basename(name)}: could not extract from ZIP ({reason})")
+                    continue
+                except Exception:
+                    _remove_files([output_path])
+                    raise
+
+                total_bytes += entry_bytes
+                pdf_files.append((os.path.basename(name), output_path))
+
+    except zipfile.BadZipFile:
+        raise ValueError(f"{os.path.basename(zip_path)} is not a valid ZIP file")
+    except Exception:
+        _remove_files([path for _, path in pdf_files])
+        raise
+
+    return pdf_files, errors, total_bytes
+
+
+def _unique_docx_name(pdf_name: str, used_names: set):
+    stem = Path(pdf_name).stem or "document"
+    docx_name = f"{stem}.docx"
+    counter = 1
+    while docx_name in used_names:
+        counter += 1
+        docx_name = f"{stem}_{counter}.docx"
+    used_names.add(docx_name)
+    return docx_name
+
+
+def _convert_one(pdf_path: str, output_path: str, ocr: bool):
+    limits = {"timeout": OCR_JOB_TIMEOUT} if ocr else {}
+    run_sandboxed(convert_pdf_to_word, pdf_path, output_path, ocr, **limits)
+
+
+def iter_batch_zip(pdf_files: list, output_dir: str, ocr: bool = False, errors: list = None):
+    """
+    Convert PDFs to Word in parallel and yield a ZIP of the results
+    pdf_files: list of (original_name, pdf_path)
+    errors: problems already found while unpacking the upload
+    Each DOCX is added as soon as it finishes and is streamed in chunks, so
+    memory stays flat however large the batch is. Failed files are listed
+    in errors.txt instead of failing the whole batch
+    """
+    stream = _ZipStream()
+    used_names = set()
+    errors = list(errors or [])
+    failed = 0
+    futures = {}
+
+    try:
+        for idx, (pdf_name, pdf_path) in enumerate(pdf_files):
+            output_path = os.path.join(output_dir, f"{Path(pdf_path).stem}_{idx}.docx")
+            future = _batch_executor.submit(_convert_one, pdf_path, output_path, ocr)
+            futures[future] = (pdf_name, pdf_path, output_path)
+
+        with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for future in as_completed(list(futures)):
+                pdf_name, pdf_path, output_path = futures.pop(future)
+                try:
+                    future.result()
+                    docx_name = _unique_docx_name(pdf_name, used_names)
+                    with open(output_path, 'rb') as source, archive.open(docx_name, 'w') as target:
+                        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                            target.write(chunk)
+                            yield from stream.drain()
+                    print(f"✓ Batch: converted {pdf_name}")
+                except Exception as e:
+                    print(f"❌ Batch: {pdf_name} failed: {str(e)}")
+                    errors.append(f"{pdf_name}: {str(e)}")
+                    failed += 1
+                finally:
+                    _remove_files([pdf_path, output_path])
+                yield from stream.drain()
+
+            if errors:
+                archive.writestr("errors.txt", "\n".join(errors) + "\n")
+
+        print(f"✓ Batch complete: {len(pdf_files) - failed} converted, {len(errors)} errors")
+        yield from stream.drain()
+
+    finally:
+        # Client may have disconnected: drop queued jobs, and remove the files
+        # of running ones once they finish
+        for future, (_, pdf_path, output_path) in futures.items():
+            if not future.cancel():
+                future.add_done_callback(lambda _, paths=(pdf_path, output_path): _remove_files(paths))
+        _remove_files([pdf_path for _, pdf_path in pdf_files])
@@ -0,0 +1,220 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import multiprocessing
+import hashlib
+import shutil
+import time
+import os
+
+from converters.sandbox import (
+    JOB_HELPER_PROCESSES,
+    HELPER_MEMORY_BYTES,
+    remaining_cpu_seconds,
+    children_cpu_seconds,
+    charge_job_cpu,
+    limit_helper_process,
+)
+
+# OCR text per page, keyed by a hash of the page's content and images
+OCR_CACHE_DIR = Path("cache") / "ocr"
+OCR_CACHE_TTL = 60 * 60
+OCR_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+OCR_LANGUAGE = "eng"
+OCR_DPI = 300
+# Per job: every sandbox worker may run its own OCR pool at the same time,
+# the sandbox sizes the worker pool with these helpers included
+OCR_WORKERS = JOB_HELPER_PROCESSES
+OCR_PAGE_TIMEOUT = 60
+
+# Whole PDF-to-Word job budget when OCR is requested
+OCR_JOB_TIMEOUT = 600
+
+
+def ocr_available():
+    """True if pytesseract and the tesseract binary are installed"""
+    try:
+        import pytesseract  # noqa: F401
+    except ImportError:
+        return False
+    return shutil.which("tesseract") is not None
+
+
+def _page_hash(doc, page):
+    """
+    Hash of the page content stream plus the raw streams of its images
+    Cheap compared to rendering, and identical scans hit the same cache entry
+    """
+    digest = hashlib.sha256()
+    digest.update(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]))
+    digest.update(f"{OCR_LANGUAGE}:{OCR_DPI}".encode())
+    return digest.hexdigest()
+
+
+def find_image_only_pages(doc):
+    """
+    Pages that have images but no text layer
+    Returns list of (page_index, page_hash)
+    """
+    pages = []
+    for page in doc:
+        if page.get_text("text").strip():
+            continue
+        if not page.get_images():
+            continue
+        pages.append((page.number, _page_hash(doc, page)))
+    return pages
+
+
+def _ocr_page(pdf_path: str, page_index: int):
+    """Render a single page and run Tesseract on it (runs in a pool process)"""
+    import fitz
+    import pytesseract
+    from PIL import Image
+
+    doc = fitz.open(pdf_path)
+    try:
+        pixmap = doc[page_index].get_pixmap(dpi=OCR_DPI)
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    finally:
+        doc.close()
+
+    return pytesseract.image_to_string(image, lang=OCR_LANGUAGE, timeout=OCR_PAGE_TIMEOUT)
+
+
+def _read_cache(page_hash: str):
+    cache_path = OCR_CACHE_DIR / f"{page_hash}.txt"
+    try:
+        if time.time() - cache_path.stat().st_mtime <= OCR_CACHE_TTL:
+            return cache_path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def _write_cache(page_hash: str, text: str):
+    OCR_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cache_path = OCR_CACHE_DIR / f"{page_hash}.txt"
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, cache_path)
+
+
+def prune_ocr_cache():
+    """Drop expired OCR texts, then the oldest ones while over the size cap"""
+    if not OCR_CACHE_DIR.exists():
+        return
+
+    current_time = time.time()
+    entries = []
+    for file_path in OCR_CACHE_DIR.glob("*"):
+        try:
+            stat = file_path.stat()
+            if current_time - stat.st_mtime > OCR_CACHE_TTL:
+                file_path.unlink()
+            else:
+                entries.append((stat.st_mtime, stat.st_size, file_path))
+        except FileNotFoundError:
+            continue
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, file_path in sorted(entries):
+        if total_size <= OCR_CACHE_MAX_BYTES:
+            break
+        try:
+            file_path.unlink()
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+def ocr_scanned_pages(pdf_path: str):
+    """
+    OCR only the image-only pages of a PDF, in parallel
+    Returns dict of page_index -> text (empty if OCR is not available)
+    """
+    if not ocr_available():
+        print("OCR requested but pytesseract / tesseract is not installed, skipping")
+        return {}
+
+    import fitz
+
+    doc = fitz.open(pdf_path)
+    try:
+        scanned_pages = find_image_only_pages(doc)
+    finally:
+        doc.close()
+
+    if not scanned_pages:
+        print("No scanned pages found, OCR not needed")
+        return {}
+
+    page_texts = {}
+    pending = []
+    for page_index, page_hash in scanned_pages:
+        cached_text = _read_cache(page_hash)
+        if cached_text is not None:
+            page_texts[page_index] = cached_text
+        else:
+            pending.append((page_index, page_hash))
+
+    print(f"Scanned pages: {len(scanned_pages)} ({len(page_texts)} cached, {len(pending)} to OCR)")
+
+    if pending:
+        workers = min(OCR_WORKERS, len(pending))
+        # Split what is left of the job's CPU budget between the OCR processes,
+        # and charge what they used back to the job once they are reaped
+        cpu_seconds = remaining_cpu_seconds()
+        if cpu_seconds is not None:
+            cpu_seconds = max(1, cpu_seconds // workers)
+        children_cpu_before = children_cpu_seconds()
+
+        # fork, not the forkserver the sandbox worker inherited: children stay in the
+        # worker's process group and die with it if the job is killed
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=limit_helper_process,
+                initargs=(cpu_seconds, HELPER_MEMORY_BYTES)
+            ) as executor:
+                futures = {
+                    page_index: (page_hash, executor.submit(_ocr_page, pdf_path, page_index))
+                    for page_index, page_hash in pending
+                }
+                for page_index, (page_hash, future) in futures.items():
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        print(f"OCR failed on page {page_index + 1}: {str(e)}")
+                        continue
+                    page_texts[page_index] = text
+                    _write_cache(page_hash, text)
+        finally:
+            charge_job_cpu(children_cpu_seconds() - children_cpu_before)
+
+    return page_texts
+
+
+def add_ocr_text(docx_path: str, page_texts: dict):
+    """Append the OCR text of each scanned page to a Word document"""
+    from docx import Document
+
+    doc = Document(docx_path)
+
+    for page_index in sorted(page_texts):
+        text = page_texts[page_index].strip()
+        if not text:
+            continue
+
+        if doc.paragraphs or doc.tables:
+            doc.add_page_break()
+        doc.add_heading(f"Page {page_index + 1} (OCR text)", level=2)
+
+        for paragraph in text.split('\n\n'):
+            if paragraph.strip():
+                doc.add_paragraph(paragraph.strip())
+
+    doc.save(docx_path)
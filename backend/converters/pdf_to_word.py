@@ -1,17 +1,34 @@
-from pdf2docx import Converter
-from docx import Document
-import PyPDF2
+from converters.ocr_pdf import ocr_scanned_pages, add_ocr_text
 
-def convert_pdf_to_word(pdf_path: str, output_path: str):
+def convert_pdf_to_word(pdf_path: str, output_path: str, ocr: bool = False):
     """
     Convert PDF to Word document
+    ocr: also OCR scanned (image-only) pages and add their text
     """
+    # Imported here, pdf2docx pulls in PyMuPDF, OpenCV and numpy which would
+    # slow down server startup; sandbox workers preload them instead
+    from pdf2docx import Converter
+    from docx import Document
+    import PyPDF2
+    
+    # OCR scanned pages first so both methods below can use the text
+    page_texts = {}
+    if ocr:
+        try:
+            page_texts = ocr_scanned_pages(pdf_path)
+        except Exception as e:
+            print(f"OCR failed, continuing without it: {str(e)}")
+    
     try:
         # Method 1: Using pdf2docx (preserves formatting better)
         cv = Converter(pdf_path)
         cv.convert(output_path, start=0, end=None)
         cv.close()
         
+        if page_texts:
+            add_ocr_text(output_path, page_texts)
+            print(f"Added OCR text for {len(page_texts)} scanned pages")
+        
         print(f"PDF converted to Word successfully using pdf2docx")
         
     except Exception as e:
@@ -27,7 +44,8 @@ def convert_pdf_to_word(pdf_path: str, output_path: str):
                 
                 for page_num in range(len(pdf_reader.pages)):
                     page = pdf_reader.pages[page_num]
-                    text += page.extract_text()
+                    # Scanned pages have no text layer, use their OCR text instead
+                    text += page.extract_text() or page_texts.get(page_num, "")
             
             # Create Word document
             doc = Document()
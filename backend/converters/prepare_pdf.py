@@ -0,0 +1,211 @@
+from PyPDF2 import PdfReader, PdfWriter
+from pathlib import Path
+import hashlib
+import time
+import os
+
+from converters.sandbox import run_sandboxed, SandboxError, WorkerMemoryError, WorkerTimeoutError, WorkerKilledError
+
+# Repaired / decrypted copies, keyed by content hash so retries skip the repair
+REPAIR_CACHE_DIR = Path("cache") / "repaired"
+
+# Decrypted copies are plaintext, so keep them only long enough for retries
+REPAIR_CACHE_TTL = 10 * 60
+REPAIR_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Files that could not be repaired fail fast on retry for this long
+REPAIR_FAILURE_TTL = 5 * 60
+
+# Expired entries are removed at least this often
+REPAIR_CACHE_PRUNE_INTERVAL = 60
+
+# Budget for a single repair run
+REPAIR_CPU_SECONDS = 20
+REPAIR_MEMORY_BYTES = 512 * 1024 * 1024
+REPAIR_TIMEOUT = 30
+
+
+class PdfPasswordError(Exception):
+    """PDF is encrypted and no (or a wrong) password was supplied"""
+
+
+class PdfRepairError(Exception):
+    """PDF is damaged and could not be repaired within the budget"""
+
+
+class _CachedRepairError(PdfRepairError):
+    """Repair failure caused by the file itself, safe to remember for retries"""
+
+
+def _content_hash(pdf_path: str, password: str = None):
+    """
+    SHA-256 of the file contents (plus the password, so a decrypted copy
+    is never served to someone who did not supply it)
+    """
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    if password:
+        digest.update(b"\0" + password.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _decrypt(reader: PdfReader, password: str = None):
+    """Decrypt reader in place, raising PdfPasswordError on failure"""
+    try:
+        # Many PDFs only carry an owner password and open with an empty one
+        if reader.decrypt(password or ""):
+            return
+    except NotImplementedError as e:
+        raise PdfRepairError(f"Unsupported encryption: {str(e)}")
+
+    if password:
+        raise PdfPasswordError("Incorrect password for encrypted PDF")
+    raise PdfPasswordError("PDF is password protected. Please provide the password")
+
+
+def prune_repair_cache():
+    """Drop expired cache entries, then the oldest ones while over the size cap"""
+    if not REPAIR_CACHE_DIR.exists():
+        return
+
+    current_time = time.time()
+    entries = []
+    for file_path in REPAIR_CACHE_DIR.glob("*"):
+        try:
+            stat = file_path.stat()
+            ttl = REPAIR_FAILURE_TTL if file_path.suffix == ".failed" else REPAIR_CACHE_TTL
+            if current_time - stat.st_mtime > ttl:
+                file_path.unlink()
+            else:
+                entries.append((stat.st_mtime, stat.st_size, file_path))
+        except FileNotFoundError:
+            continue
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, file_path in sorted(entries):
+        if total_size <= REPAIR_CACHE_MAX_BYTES:
+            break
+        try:
+            file_path.unlink()
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+def _is_fresh(cache_path: Path, ttl: int):
+    """True if cache_path exists and is younger than ttl seconds"""
+    try:
+        return time.time() - cache_path.stat().st_mtime <= ttl
+    except FileNotFoundError:
+        return False
+
+
+def _probe_pdf(pdf_path: str, password: str = None):
+    """
+    Runs in a sandbox worker: decide what an upload needs
+    Returns "ok" for a healthy, unencrypted file, "decrypt" for an encrypted
+    one whose password checks out, "repair" if the strict parse fails
+    """
+    try:
+        # Strict, so a healthy file never falls back to scanning the whole file
+        reader = PdfReader(pdf_path, strict=True)
+        if not reader.is_encrypted:
+            len(reader.pages)
+            return "ok"
+    except MemoryError:
+        raise
+    except Exception:
+        return "repair"
+
+    # Check the password up front so a wrong one fails fast
+    _decrypt(reader, password)
+    return "decrypt"
+
+
+def _rewrite_pdf(pdf_path: str, output_path: str, password: str = None):
+    """
+    Runs in a sandbox worker: read leniently (rebuilding a broken xref),
+    decrypt if needed and write a clean copy to output_path
+    """
+    reader = PdfReader(pdf_path, strict=False)
+    if reader.is_encrypted:
+        _decrypt(reader, password)
+
+    writer = PdfWriter()
+    for page in reader.pages:
+        writer.add_page(page)
+
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as output_file:
+        writer.write(output_file)
+    os.replace(tmp_path, output_path)
+
+
+def _run_bounded(func, *args):
+    """Run a probe / repair step in a worker process with the repair CPU, memory and wall-clock budget"""
+    try:
+        return run_sandboxed(
+            func, *args,
+            timeout=REPAIR_TIMEOUT,
+            cpu_seconds=REPAIR_CPU_SECONDS,
+            memory_bytes=REPAIR_MEMORY_BYTES
+        )
+    except PdfPasswordError:
+        raise
+    except PdfRepairError as e:
+        raise _CachedRepairError(str(e))
+    except WorkerKilledError:
+        # Possibly the OOM killer reacting to load elsewhere, not the file's fault
+        raise
+    except (WorkerTimeoutError, WorkerMemoryError) as e:
+        raise _CachedRepairError(f"Repair exceeded its resource budget: {str(e)}")
+    except SandboxError:
+        # Pool trouble (shutting down, worker crash), let the caller retry later
+        raise
+    except Exception as e:
+        raise _CachedRepairError(f"Could not repair PDF: {str(e)}")
+
+
+def prepare_pdf(pdf_path: str, password: str = None):
+    """
+    Pre-process an uploaded PDF before splitting / merging
+    Returns a path that PdfReader can open directly: the original file if it
+    is healthy, otherwise a decrypted / repaired copy from the cache
+    Only hashing and cache lookups run here, every parse of the upload runs
+    in a sandbox worker
+    """
+    cache_key = _content_hash(pdf_path, password)
+    cached_path = REPAIR_CACHE_DIR / f"{cache_key}.pdf"
+    failed_path = REPAIR_CACHE_DIR / f"{cache_key}.failed"
+
+    if _is_fresh(cached_path, REPAIR_CACHE_TTL):
+        print(f"✓ Using cached repaired PDF: {cached_path.name}")
+        return str(cached_path)
+
+    if _is_fresh(failed_path, REPAIR_FAILURE_TTL):
+        print(f"✓ Repair failed recently, not retrying: {failed_path.name}")
+        raise PdfRepairError(failed_path.read_text(encoding="utf-8"))
+
+    try:
+        status = _run_bounded(_probe_pdf, pdf_path, password)
+        if status == "ok":
+            return pdf_path
+
+        if status == "decrypt":
+            print(f"✓ Decrypting {os.path.basename(pdf_path)}")
+        else:
+            print(f"⚠ Damaged PDF, repairing {os.path.basename(pdf_path)}")
+
+        REPAIR_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        prune_repair_cache()
+        _run_bounded(_rewrite_pdf, pdf_path, str(cached_path), password)
+    except _CachedRepairError as e:
+        # Remember the failure so a retry of the same file does not burn the budget again
+        REPAIR_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        failed_path.write_text(str(e), encoding="utf-8")
+        raise
+
+    print(f"✓ Prepared PDF cached as: {cached_path.name}")
+    return str(cached_path)
@@ -0,0 +1,457 @@
+import multiprocessing
+import multiprocessing.connection
+import importlib
+import threading
+import pickle
+import signal
+import os
+
+try:
+    import resource
+except ImportError:  # Windows has no resource module, limits are skipped there
+    resource = None
+
+# Default budget for a single job, memory is on top of what the warm worker already maps
+JOB_TIMEOUT = 120
+JOB_CPU_SECONDS = 90
+JOB_MEMORY_BYTES = 2048 * 1024 * 1024
+
+# Helper processes a job may start (OCR), each with its own memory budget
+JOB_HELPER_PROCESSES = 2
+HELPER_MEMORY_BYTES = 512 * 1024 * 1024
+
+# Rough footprint of a warm worker, and memory kept back for the API process
+WORKER_BASE_MEMORY_BYTES = 512 * 1024 * 1024
+API_RESERVED_MEMORY_BYTES = 1024 * 1024 * 1024
+
+
+def _default_worker_count():
+    """One worker per CPU, but no more than host RAM can back at the full job budget"""
+    workers = os.cpu_count() or 2
+    try:
+        total_memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return workers
+    per_worker = WORKER_BASE_MEMORY_BYTES + JOB_MEMORY_BYTES + JOB_HELPER_PROCESSES * HELPER_MEMORY_BYTES
+    return max(1, min(workers, (total_memory - API_RESERVED_MEMORY_BYTES) // per_worker))
+
+
+# Pool size and recycling
+WORKER_COUNT = _default_worker_count()
+JOBS_PER_WORKER = 25
+
+# Heavy converter imports, loaded once by the forkserver so every worker
+# (including recycled ones) starts warm, and never by the API process
+PRELOAD_MODULES = [
+    "PyPDF2",
+    "docx",
+    "pdf2docx",
+    "converters.pdf_to_word",
+    "converters.split_pdf",
+    "converters.merge_pdf",
+    "converters.prepare_pdf",
+]
+
+
+class SandboxError(Exception):
+    """Job was killed or crashed inside its worker"""
+
+
+class WorkerMemoryError(SandboxError):
+    """Job exceeded its memory budget"""
+
+
+class WorkerTimeoutError(SandboxError):
+    """Job exceeded its CPU or wall-clock budget"""
+
+
+class WorkerKilledError(WorkerMemoryError):
+    """
+    Worker was SIGKILLed mid-job, most likely by the kernel OOM killer
+    That may be host-wide memory pressure rather than the document itself
+    """
+
+
+def _set_soft_limit(limit: int, value):
+    """Set a soft limit, never going past the hard limit the worker inherited"""
+    hard = resource.getrlimit(limit)[1]
+    if value is None or (hard != resource.RLIM_INFINITY and value > hard):
+        value = hard
+    resource.setrlimit(limit, (value, hard))
+
+
+def _address_space_in_use():
+    """Current virtual memory size (VmSize) of this process in bytes, 0 if unknown"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _set_job_limits(cpu_seconds: int, memory_bytes: int):
+    """Limit the next job's CPU time and address space, both on top of what is already in use"""
+    if resource is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime)
+    _set_soft_limit(resource.RLIMIT_CPU, used + cpu_seconds)
+    _set_soft_limit(resource.RLIMIT_AS, _address_space_in_use() + memory_bytes)
+
+
+def _clear_job_limits():
+    if resource is None:
+        return
+    _set_soft_limit(resource.RLIMIT_CPU, None)
+    _set_soft_limit(resource.RLIMIT_AS, None)
+
+
+def remaining_cpu_seconds():
+    """CPU seconds left in the running job's budget, None if it has no CPU limit"""
+    if resource is None:
+        return None
+    soft = resource.getrlimit(resource.RLIMIT_CPU)[0]
+    if soft == resource.RLIM_INFINITY:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return max(0, soft - int(usage.ru_utime + usage.ru_stime))
+
+
+def children_cpu_seconds():
+    """CPU time used by the reaped children of this process (and the children they waited for)"""
+    if resource is None:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def charge_job_cpu(seconds: float):
+    """Take CPU time used by the job's helper processes off the job's own CPU budget"""
+    if resource is None:
+        return
+    soft = resource.getrlimit(resource.RLIMIT_CPU)[0]
+    if soft != resource.RLIM_INFINITY:
+        # RLIMIT_CPU treats 0 as 1 second anyway
+        _set_soft_limit(resource.RLIMIT_CPU, max(1, soft - int(seconds)))
+
+
+def limit_helper_process(cpu_seconds: int, memory_bytes: int):
+    """
+    Initializer for helper processes a job starts (e.g. the OCR pool)
+    Gives the helper its own share of the job's budget instead of a copy of
+    the whole one, and makes it die with the worker on Linux
+    """
+    if resource is not None:
+        if cpu_seconds is not None:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            _set_soft_limit(resource.RLIMIT_CPU, int(usage.ru_utime + usage.ru_stime) + cpu_seconds)
+        _set_soft_limit(resource.RLIMIT_AS, _address_space_in_use() + memory_bytes)
+
+    try:
+        import ctypes
+        PR_SET_PDEATHSIG = 1
+        ctypes.CDLL("libc.so.6").prctl(PR_SET_PDEATHSIG, signal.SIGKILL)
+    except (OSError, AttributeError):
+        pass
+
+
+def _ran_out_of_memory(error: BaseException):
+    """True if a MemoryError is anywhere in the exception chain (converters re-wrap errors)"""
+    while error is not None:
+        if isinstance(error, MemoryError):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _import_modules(modules: list):
+    """Warm-up job, a no-op when the forkserver already preloaded the modules"""
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"Could not preload {name}: {str(e)}")
+
+
+def _worker_main(conn):
+    """Worker loop: run (func, args, cpu_seconds, memory_bytes) jobs until told to stop"""
+    # Own process group, so killing the worker also kills anything its job started
+    if hasattr(os, "setsid"):
+        os.setsid()
+
+    # If the host runs out of memory, the kernel should kill a worker, not the API
+    try:
+        with open("/proc/self/oom_score_adj", "w") as oom_score_adj:
+            oom_score_adj.write("1000")
+    except OSError:
+        pass
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        func, args, cpu_seconds, memory_bytes = job
+        try:
+            _set_job_limits(cpu_seconds, memory_bytes)
+            result = func(*args)
+            _clear_job_limits()
+            conn.send((True, result))
+        except BaseException as e:
+            _clear_job_limits()
+            if _ran_out_of_memory(e):
+                e = WorkerMemoryError("Document needs more memory than allowed")
+            else:
+                # Some exceptions pickle fine but cannot be rebuilt (extra __init__ args)
+                try:
+                    pickle.loads(pickle.dumps(e))
+                except Exception:
+                    e = Exception(str(e))
+            conn.send((False, e))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        # Not a daemon so jobs can start their own helper processes
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,))
+        self.process.start()
+        child_conn.close()
+        self.jobs_done = 0
+        self.killed = False
+        self._reaped = False
+        self._lock = threading.Lock()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        # Give it time to exit cleanly, kill() only signals the group if it did not
+        multiprocessing.connection.wait([self.process.sentinel], timeout=5)
+        self.kill()
+
+    def kill(self):
+        with self._lock:
+            self.killed = True
+            if self._reaped:
+                return
+            # The worker leads its own process group (see _worker_main), but once it
+            # is reaped its pid may be reused, so only signal the group while the
+            # sentinel says it has not exited. Helpers of a worker that died on its
+            # own are left to their own limits
+            if not multiprocessing.connection.wait([self.process.sentinel], timeout=0):
+                if hasattr(os, "killpg"):
+                    try:
+                        os.killpg(self.process.pid, signal.SIGKILL)
+                    except (ProcessLookupError, PermissionError):
+                        pass
+                else:
+                    self.process.kill()
+            self.process.join()
+            self._reaped = True
+            self.conn.close()
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of converter processes
+    Each job gets its own CPU / memory / wall-clock budget; a job that blows
+    it only takes down its own worker, which is replaced on the next job
+    """
+
+    def __init__(self, size: int = WORKER_COUNT, jobs_per_worker: int = JOBS_PER_WORKER):
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self._ctx = multiprocessing.get_context(method)
+        if method == "forkserver":
+            self._ctx.set_forkserver_preload(PRELOAD_MODULES)
+
+        # One job per process, so BLAS thread pools (numpy via pdf2docx) and
+        # tesseract's OpenMP threads only add address space and CPU time
+        for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "OMP_THREAD_LIMIT"):
+            os.environ.setdefault(variable, "1")
+
+        self._size = size
+        self._jobs_per_worker = jobs_per_worker
+        self._idle = []
+        self._workers = set()
+        self._starting = 0
+        self._condition = threading.Condition()
+
+    def _acquire(self):
+        with self._condition:
+            while not self._idle and len(self._workers) + self._starting >= self._size:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            # Reserve the slot, the process is started outside the lock
+            self._starting += 1
+
+        try:
+            worker = _Worker(self._ctx)
+        except Exception:
+            with self._condition:
+                self._starting -= 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self._starting -= 1
+            self._workers.add(worker)
+        return worker
+
+    def _release(self, worker: _Worker):
+        with self._condition:
+            self._idle.append(worker)
+            self._condition.notify()
+
+    def _discard(self, worker: _Worker):
+        with self._condition:
+            self._workers.discard(worker)
+            self._condition.notify()
+
+    def run(self, func, *args, timeout: int = JOB_TIMEOUT,
+            cpu_seconds: int = JOB_CPU_SECONDS, memory_bytes: int = JOB_MEMORY_BYTES):
+        """Run func(*args) in a worker and return its result, re-raising its exception"""
+        worker = None
+        # Set once the worker went back to the pool or was discarded, anything
+        # else is cleaned up in finally so a slot can never leak
+        settled = False
+        try:
+            worker = self._acquire()
+
+            try:
+                worker.conn.send((func, args, cpu_seconds, memory_bytes))
+            except (BrokenPipeError, OSError):
+                raise SandboxError("Converter worker is not available")
+            except Exception:
+                # Job could not be pickled, the worker itself is fine
+                self._release(worker)
+                settled = True
+                raise
+
+            if not worker.conn.poll(timeout):
+                raise WorkerTimeoutError(f"Processing took longer than {timeout} seconds")
+
+            try:
+                ok, payload = worker.conn.recv()
+            except (EOFError, OSError):
+                # Worker died mid-job: SIGXCPU means the CPU budget ran out, SIGKILL
+                # from anyone but us the OOM killer, anything else (e.g. SIGSEGV) is a crash
+                killed_by_pool = worker.killed
+                worker.kill()
+                self._discard(worker)
+                settled = True
+                signal_number = -worker.process.exitcode if worker.process.exitcode else 0
+                if killed_by_pool:
+                    raise SandboxError("Converter pool is shutting down")
+                if signal_number == getattr(signal, "SIGXCPU", None):
+                    raise WorkerTimeoutError(f"Processing used more than {cpu_seconds} seconds of CPU")
+                if signal_number == getattr(signal, "SIGKILL", None):
+                    raise WorkerKilledError("Document needs more memory than allowed")
+                raise SandboxError(f"Converter worker crashed (exit code {worker.process.exitcode})")
+            except Exception as e:
+                raise SandboxError(f"Could not read converter result: {str(e)}")
+
+            worker.jobs_done += 1
+            # Recycle after N jobs, or right away after a MemoryError, to drop a fragmented heap
+            if worker.jobs_done >= self._jobs_per_worker or isinstance(payload, WorkerMemoryError):
+                worker.stop()
+                self._discard(worker)
+            else:
+                self._release(worker)
+            settled = True
+
+        finally:
+            if worker is not None and not settled:
+                worker.kill()
+                self._discard(worker)
+
+        if not ok:
+            raise payload
+        return payload
+
+    def shutdown(self):
+        """Stop idle workers and kill busy ones"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            if worker in idle:
+                worker.stop()
+            else:
+                worker.kill()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_warm = threading.Event()
+_warm_failed = threading.Event()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+        return _pool
+
+
+def run_sandboxed(func, *args, **limits):
+    """
+    Run a converter function in the shared worker pool
+    limits: optional timeout / cpu_seconds / memory_bytes overrides
+    """
+    return get_pool().run(func, *args, **limits)
+
+
+def warm_pool():
+    """
+    Start every worker and load the converter modules, then mark the pool warm
+    (or failed, if no worker could be started)
+    Blocking, meant to run in a background thread at startup
+    """
+    pool = get_pool()
+    warmed = []
+
+    def warm_one():
+        try:
+            pool.run(_import_modules, PRELOAD_MODULES)
+            warmed.append(True)
+        except Exception as e:
+            print(f"Worker warm-up failed: {str(e)}")
+
+    # Concurrent jobs, so each one starts its own worker
+    threads = [threading.Thread(target=warm_one) for _ in range(pool._size)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if not warmed:
+        _warm_failed.set()
+        print("❌ No converter worker could be started")
+        return
+
+    _warm.set()
+    print(f"✓ {len(warmed)} of {pool._size} converter workers warm")
+
+
+def is_warm():
+    return _warm.is_set()
+
+
+def warm_up_failed():
+    return _warm_failed.is_set()
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
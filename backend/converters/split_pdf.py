@@ -11,6 +11,13 @@ app = FastAPI()
 UPLOAD_DIR = "uploads"  # Define your upload directory
 OUTPUT_DIR = "outputs"  # Define your output directory
 
+def get_page_count(pdf_path: str):
+    """
+    Number of pages in a PDF
+    """
+    return len(PdfReader(pdf_path).pages)
+
+
 def split_pdf_all_pages(pdf_path: str, output_dir: str):
     """
     Split PDF into individual pages
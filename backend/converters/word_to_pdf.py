@@ -1,4 +1,3 @@
-from docx2pdf import convert
 import os
 
 def convert_word_to_pdf(docx_path: str, output_path: str):
@@ -6,6 +5,9 @@ def convert_word_to_pdf(docx_path: str, output_path: str):
     Convert Word document to PDF with exact formatting preservation
     Uses Microsoft Word COM automation for perfect conversion
     """
+    # Imported on first use to keep server startup fast
+    from docx2pdf import convert
+    
     try:
         # Convert using docx2pdf (uses MS Word)
         convert(docx_path, output_path)
@@ -1,18 +1,26 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 import os
 import shutil
 from pathlib import Path
 import time
+import uuid
+import threading
+import asyncio
 from contextlib import asynccontextmanager
 from typing import List
 
 # Import conversion modules
 from converters.pdf_to_word import convert_pdf_to_word
+from converters.ocr_pdf import prune_ocr_cache, OCR_CACHE_DIR, OCR_JOB_TIMEOUT
+from converters.batch_pdf_to_word import extract_pdfs_from_zip, iter_batch_zip, MAX_BATCH_FILES, MAX_BATCH_BYTES
 from converters.word_to_pdf import convert_word_to_pdf
-from converters.split_pdf import split_pdf_range, split_pdf_custom, parse_page_string
+from converters.split_pdf import split_pdf_range, split_pdf_custom, parse_page_string, get_page_count
 from converters.merge_pdf import merge_pdfs
+from converters.prepare_pdf import prepare_pdf, prune_repair_cache, PdfPasswordError, PdfRepairError, REPAIR_CACHE_DIR, REPAIR_CACHE_PRUNE_INTERVAL
+from converters.sandbox import run_sandboxed, warm_pool, is_warm, warm_up_failed, shutdown_pool, SandboxError, WorkerMemoryError
 
 # Create directories
 UPLOAD_DIR = Path("uploads")
@@ -23,19 +31,37 @@ OUTPUT_DIR.mkdir(exist_ok=True)
 # Cleanup old files (older than 1 hour)
 def cleanup_old_files():
     current_time = time.time()
-    for directory in [UPLOAD_DIR, OUTPUT_DIR]:
+    for directory in [UPLOAD_DIR, OUTPUT_DIR, REPAIR_CACHE_DIR, OCR_CACHE_DIR]:
+        if not directory.exists():
+            continue
         for file_path in directory.glob("*"):
             if file_path.is_file():
                 file_age = current_time - file_path.stat().st_mtime
                 if file_age > 3600:  # 1 hour
                     file_path.unlink()
 
+# Decrypted PDFs in the repair cache must not outlive their TTL,
+# and neither cache may grow past its size cap
+async def prune_caches_periodically():
+    while True:
+        await asyncio.sleep(REPAIR_CACHE_PRUNE_INTERVAL)
+        for prune in (prune_repair_cache, prune_ocr_cache):
+            try:
+                await run_in_threadpool(prune)
+            except Exception as e:
+                print(f"Cache pruning failed: {str(e)}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     cleanup_old_files()
+    prune_task = asyncio.create_task(prune_caches_periodically())
+    # Start converter workers and load heavy imports without blocking startup
+    threading.Thread(target=warm_pool, daemon=True).start()
     yield
-    # Shutdown (if needed)
+    # Shutdown
+    prune_task.cancel()
+    shutdown_pool()
 
 app = FastAPI(title="I Hate PDF API", lifespan=lifespan)
 
@@ -58,11 +84,23 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "OK", "message": "Server is running"}
+    # 503 until warm, so readiness probes keep traffic away from a cold instance
+    if warm_up_failed():
+        return JSONResponse(
+            status_code=503,
+            content={"status": "FAILED", "ready": False, "message": "Converter workers could not be started"}
+        )
+    if not is_warm():
+        return JSONResponse(
+            status_code=503,
+            content={"status": "WARMING", "ready": False, "message": "Converter workers are starting"}
+        )
+    return {"status": "OK", "ready": True, "message": "Server is running"}
 
 @app.post("/api/pdf-to-word")
-async def pdf_to_word(pdf: UploadFile = File(...)):
+async def pdf_to_word(pdf: UploadFile = File(...), ocr: bool = Form(False)):
     """Convert PDF to Word document"""
+    upload_path = None
     try:
         # Validate file type
         if not pdf.filename.endswith('.pdf'):
@@ -81,7 +119,10 @@ async def pdf_to_word(pdf: UploadFile = File(...)):
         output_filename = f"converted_{timestamp}.docx"
         output_path = OUTPUT_DIR / output_filename
         
-        convert_pdf_to_word(str(upload_path), str(output_path))
+        # Run the conversion in a resource-limited worker process
+        # OCR of scanned pages gets a longer wall-clock budget
+        limits = {"timeout": OCR_JOB_TIMEOUT} if ocr else {}
+        await run_in_threadpool(run_sandboxed, convert_pdf_to_word, str(upload_path), str(output_path), ocr, **limits)
         
         print(f"Conversion successful: {output_filename}")
         
@@ -96,13 +137,119 @@ async def pdf_to_word(pdf: UploadFile = File(...)):
             background=lambda: output_path.unlink() if output_path.exists() else None
         )
         
+    except SandboxError as e:
+        print(f"PDF to Word conversion killed: {str(e)}")
+        if upload_path and upload_path.exists():
+            upload_path.unlink()
+        status_code = 413 if isinstance(e, WorkerMemoryError) else 422
+        raise HTTPException(status_code=status_code, detail=f"Conversion failed: {str(e)}")
+        
     except Exception as e:
         print(f"Error during PDF to Word conversion: {str(e)}")
         # Cleanup on error
-        if upload_path.exists():
+        if upload_path and upload_path.exists():
             upload_path.unlink()
         raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
 
+@app.post("/api/pdf-to-word/batch")
+async def pdf_to_word_batch(
+    files: List[UploadFile] = File(...),
+    ocr: bool = Form(False)
+):
+    """Convert many PDFs (uploaded directly or inside ZIP files) to Word, returned as a ZIP"""
+    pdf_files = []
+    upload_path = None
+    
+    try:
+        print("\n" + "="*50)
+        print("BATCH PDF TO WORD REQUEST RECEIVED")
+        print("="*50)
+        
+        timestamp = int(time.time() * 1000)
+        # Unique per request, concurrent batches must never share file names
+        batch_id = f"{timestamp}_{uuid.uuid4().hex}"
+        batch_errors = []
+        batch_bytes = 0
+        
+        for idx, file in enumerate(files, 1):
+            filename = file.filename.lower()
+            if not (filename.endswith('.pdf') or filename.endswith('.zip')):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"File '{file.filename}' is not a PDF or ZIP file"
+                )
+            
+            upload_path = UPLOAD_DIR / f"{batch_id}_batch_{idx}{Path(filename).suffix}"
+            with open(upload_path, "wb") as buffer:
+                await run_in_threadpool(shutil.copyfileobj, file.file, buffer)
+            
+            if filename.endswith('.zip'):
+                # Limits apply to the whole request, not to each ZIP
+                try:
+                    extracted, errors, extracted_bytes = await run_in_threadpool(
+                        extract_pdfs_from_zip,
+                        str(upload_path),
+                        str(UPLOAD_DIR),
+                        f"{batch_id}_batch_{idx}",
+                        MAX_BATCH_FILES - len(pdf_files),
+                        MAX_BATCH_BYTES - batch_bytes
+                    )
+                finally:
+                    upload_path.unlink()
+                    upload_path = None
+                pdf_files.extend(extracted)
+                batch_errors.extend(errors)
+                batch_bytes += extracted_bytes
+                print(f"✓ Extracted {len(extracted)} PDFs from {file.filename} ({len(errors)} skipped)")
+            else:
+                pdf_files.append((file.filename, str(upload_path)))
+                batch_bytes += upload_path.stat().st_size
+                upload_path = None
+                print(f"✓ Saved file {idx}: {file.filename}")
+            
+            if len(pdf_files) > MAX_BATCH_FILES:
+                raise ValueError(f"Maximum {MAX_BATCH_FILES} PDF files allowed per batch")
+            if batch_bytes > MAX_BATCH_BYTES:
+                raise ValueError("Uploaded PDFs are too large in total")
+        
+        if not pdf_files:
+            detail = "No PDF files found in the upload"
+            if batch_errors:
+                detail += ": " + "; ".join(batch_errors)
+            raise ValueError(detail)
+        
+        print(f"✓ Converting {len(pdf_files)} PDF files")
+        
+        # Results are streamed back as each conversion finishes
+        return StreamingResponse(
+            iter_batch_zip(pdf_files, str(OUTPUT_DIR), ocr, batch_errors),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="converted_{timestamp}.zip"'}
+        )
+        
+    except (HTTPException, ValueError) as e:
+        for _, pdf_path in pdf_files:
+            if os.path.exists(pdf_path):
+                os.remove(pdf_path)
+        if upload_path and upload_path.exists():
+            upload_path.unlink()
+        if isinstance(e, HTTPException):
+            raise
+        print(f"\n❌ VALIDATION ERROR: {str(e)}\n")
+        raise HTTPException(status_code=400, detail=str(e))
+        
+    except Exception as e:
+        print(f"\n❌ ERROR: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        print("="*50 + "\n")
+        for _, pdf_path in pdf_files:
+            if os.path.exists(pdf_path):
+                os.remove(pdf_path)
+        if upload_path and upload_path.exists():
+            upload_path.unlink()
+        raise HTTPException(status_code=500, detail=f"Batch conversion failed: {str(e)}")
+
 @app.post("/api/word-to-pdf")
 async def word_to_pdf(word: UploadFile = File(...)):
     """Convert Word document to PDF"""
@@ -152,7 +299,8 @@ async def split_pdf_endpoint(
     split_mode: str = Form(...),
     start_page: int = Form(None),
     end_page: int = Form(None),
-    custom_pages: str = Form(None)
+    custom_pages: str = Form(None),
+    password: str = Form(None)
 ):
     """Split PDF based on mode"""
     upload_path = None
@@ -181,10 +329,11 @@ async def split_pdf_endpoint(
         print(f"✓ End Page: {end_page} (type: {type(end_page)})")
         print(f"✓ Custom Pages: '{custom_pages}' (type: {type(custom_pages)})")
         
-        # Get PDF info
-        from PyPDF2 import PdfReader
-        reader = PdfReader(str(upload_path))
-        total_pages = len(reader.pages)
+        # Decrypt / repair before reading
+        pdf_path = await run_in_threadpool(prepare_pdf, str(upload_path), password)
+        
+        # Get PDF info (parsed in a worker, not in the API process)
+        total_pages = await run_in_threadpool(run_sandboxed, get_page_count, pdf_path)
         print(f"✓ Total Pages in PDF: {total_pages}")
         
         # Output file
@@ -220,7 +369,7 @@ async def split_pdf_endpoint(
             
             print(f"Validated range: {start_page} to {end_page}")
             
-            split_pdf_range(str(upload_path), str(output_path), start_page, end_page)
+            await run_in_threadpool(run_sandboxed, split_pdf_range, pdf_path, str(output_path), start_page, end_page)
             
         elif split_mode == "custom":
             if not custom_pages or custom_pages.strip() == "":
@@ -232,7 +381,7 @@ async def split_pdf_endpoint(
             page_numbers = parse_page_string(custom_pages)
             print(f"Parsed pages: {page_numbers}")
             
-            split_pdf_custom(str(upload_path), str(output_path), page_numbers)
+            await run_in_threadpool(run_sandboxed, split_pdf_custom, pdf_path, str(output_path), page_numbers)
         
         else:
             raise HTTPException(status_code=400, detail=f"Invalid split mode: {split_mode}")
@@ -266,6 +415,25 @@ async def split_pdf_endpoint(
             background=cleanup
         )
         
+    except PdfPasswordError as pe:
+        print(f"\n❌ PASSWORD ERROR: {str(pe)}\n")
+        if upload_path and upload_path.exists():
+            upload_path.unlink()
+        raise HTTPException(status_code=400, detail=str(pe))
+        
+    except PdfRepairError as repair_error:
+        print(f"\n❌ REPAIR ERROR: {str(repair_error)}\n")
+        if upload_path and upload_path.exists():
+            upload_path.unlink()
+        raise HTTPException(status_code=422, detail=str(repair_error))
+        
+    except SandboxError as se:
+        print(f"\n❌ SPLIT KILLED: {str(se)}\n")
+        if upload_path and upload_path.exists():
+            upload_path.unlink()
+        status_code = 413 if isinstance(se, WorkerMemoryError) else 422
+        raise HTTPException(status_code=status_code, detail=f"Split failed: {str(se)}")
+        
     except ValueError as ve:
         print(f"\n❌ VALIDATION ERROR: {str(ve)}\n")
         if upload_path and upload_path.exists():
@@ -283,7 +451,8 @@ async def split_pdf_endpoint(
 
 @app.post("/api/merge-pdf")
 async def merge_pdf_endpoint(
-    files: List[UploadFile] = File(...)
+    files: List[UploadFile] = File(...),
+    password: str = Form(None)
 ):
     """Merge multiple PDF files into one"""
     uploaded_paths = []
@@ -327,8 +496,11 @@ async def merge_pdf_endpoint(
         output_filename = f"merged_{timestamp}.pdf"
         output_path = OUTPUT_DIR / output_filename
         
-        # Merge PDFs
-        merge_pdfs([str(path) for path in uploaded_paths], str(output_path))
+        # Decrypt / repair each file before merging
+        pdf_paths = [await run_in_threadpool(prepare_pdf, str(path), password) for path in uploaded_paths]
+        
+        # Merge PDFs in a resource-limited worker process
+        await run_in_threadpool(run_sandboxed, merge_pdfs, pdf_paths, str(output_path))
         
         # Verify output file was created
         if not output_path.exists():
@@ -368,6 +540,22 @@ async def merge_pdf_endpoint(
                 upload_path.unlink()
         raise
         
+    except (PdfPasswordError, PdfRepairError) as e:
+        print(f"\n❌ ERROR: {str(e)}\n")
+        for upload_path in uploaded_paths:
+            if upload_path.exists():
+                upload_path.unlink()
+        status_code = 400 if isinstance(e, PdfPasswordError) else 422
+        raise HTTPException(status_code=status_code, detail=str(e))
+        
+    except SandboxError as e:
+        print(f"\n❌ MERGE KILLED: {str(e)}\n")
+        for upload_path in uploaded_paths:
+            if upload_path.exists():
+                upload_path.unlink()
+        status_code = 413 if isinstance(e, WorkerMemoryError) else 422
+        raise HTTPException(status_code=status_code, detail=f"Merge failed: {str(e)}")
+        
     except Exception as e:
         print(f"\n❌ ERROR: {str(e)}")
         import traceback